@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import ccxt
+import pandas as pd
+from loguru import logger
+
+from src.scripts.fetch_ohlcv import (
+    ensure_dir,
+    init_okx,
+    load_existing_parquet,
+    load_settings,
+    parse_date,
+    symbol_to_slug,
+)
+from src.utils.funding import FUNDING_COLS, FUNDING_FILE, OPEN_INTEREST_COLS, OPEN_INTEREST_FILE
+
+# OKX 公共接口按 IP 限速（持仓量 5 次/2s，资金费率 10 次/2s），取较严者
+DEFAULT_REQUEST_INTERVAL = 0.4
+
+
+class RequestThrottle:
+    """Spaces requests from all worker threads by a shared minimum interval."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._next_at > now:
+                time.sleep(self._next_at - now)
+                now = self._next_at
+            self._next_at = now + self.interval_s
+
+
+def fetch_funding_all(
+    exchange: ccxt.okx,
+    throttle: RequestThrottle,
+    symbol: str,
+    since_ms: int,
+    until_ms: Optional[int],
+    limit: int,
+) -> List[List[float]]:
+    # OKX 只接受 after/before 游标且总是返回最新的 limit 条，因此从 until 向过去翻页
+    all_rows: List[List[float]] = []
+    cursor = until_ms
+    reached_since = False
+    while True:
+        params = {'after': cursor} if cursor is not None else {}
+        throttle.wait()
+        items = exchange.fetch_funding_rate_history(symbol, limit=limit, params=params)
+        if not items:
+            break
+        rows = [[int(it['timestamp']), float(it['fundingRate'])] for it in items if it.get('timestamp') is not None]
+        if not rows:
+            break
+        oldest_ts = min(r[0] for r in rows)
+        all_rows.extend(r for r in rows if r[0] >= since_ms and (until_ms is None or r[0] <= until_ms))
+        # 终止条件
+        if oldest_ts <= since_ms:
+            reached_since = True
+            break
+        # 防止死循环
+        if cursor is not None and oldest_ts >= cursor:
+            break
+        cursor = oldest_ts
+    if not reached_since:
+        earliest = min(r[0] for r in all_rows) if all_rows else None
+        earliest_str = datetime.utcfromtimestamp(earliest / 1000).isoformat() if earliest is not None else 'n/a'
+        logger.warning(
+            f"{symbol} funding history starts at {earliest_str}, later than requested "
+            f"{datetime.utcfromtimestamp(since_ms / 1000).isoformat()} (OKX serves ~3 months)"
+        )
+    return all_rows
+
+
+def _float_or_nan(value) -> float:
+    # 缺失值记为 NaN（未知），避免被当作真实的 0 持仓量向后填充
+    return float(value) if value is not None else float('nan')
+
+
+def fetch_open_interest_all(
+    exchange: ccxt.okx,
+    throttle: RequestThrottle,
+    symbol: str,
+    timeframe: str,
+    since_ms: int,
+    until_ms: Optional[int],
+    limit: int,
+) -> List[List[float]]:
+    # OKX 只保留最近约 1440 个周期的持仓量，从 since 向后翻页会落在保留窗口之外，
+    # 因此与资金费率一样从 until 向过去翻页
+    all_rows: List[List[float]] = []
+    cursor = until_ms
+    reached_since = False
+    while True:
+        params = {'until': cursor} if cursor is not None else {}
+        throttle.wait()
+        items = exchange.fetch_open_interest_history(symbol, timeframe=timeframe, limit=limit, params=params)
+        if not items:
+            break
+        rows = [
+            [int(it['timestamp']), _float_or_nan(it.get('openInterestAmount')), _float_or_nan(it.get('openInterestValue'))]
+            for it in items if it.get('timestamp') is not None
+        ]
+        if not rows:
+            break
+        oldest_ts = min(r[0] for r in rows)
+        all_rows.extend(r for r in rows if r[0] >= since_ms and (until_ms is None or r[0] <= until_ms))
+        # 终止条件
+        if oldest_ts <= since_ms:
+            reached_since = True
+            break
+        # 防止死循环
+        if cursor is not None and oldest_ts > cursor:
+            break
+        cursor = oldest_ts - 1
+    if not reached_since:
+        earliest = min(r[0] for r in all_rows) if all_rows else None
+        earliest_str = datetime.utcfromtimestamp(earliest / 1000).isoformat() if earliest is not None else 'n/a'
+        logger.warning(
+            f"{symbol} open interest history starts at {earliest_str}, later than requested "
+            f"{datetime.utcfromtimestamp(since_ms / 1000).isoformat()} (OKX serves ~1440 periods)"
+        )
+    return all_rows
+
+
+def merge_rows(df_old: Optional[pd.DataFrame], rows: List[List[float]], cols: List[str]) -> pd.DataFrame:
+    df_new = pd.DataFrame(rows, columns=cols)
+    if df_old is None or df_old.empty:
+        df = df_new
+    else:
+        df = pd.concat([df_old[cols], df_new], ignore_index=True)
+    df['timestamp'] = df['timestamp'].astype('int64')
+    df = df.drop_duplicates(subset=['timestamp']).sort_values('timestamp').reset_index(drop=True)
+    return df
+
+
+def resume_start_ts(existing_df: Optional[pd.DataFrame], default_since_ms: int) -> int:
+    if existing_df is None or existing_df.empty:
+        return default_since_ms
+    return int(existing_df['timestamp'].iloc[-1]) + 1
+
+
+def sync_symbol(
+    throttle: RequestThrottle,
+    symbol: str,
+    base_dir: str,
+    since_ms: int,
+    until_ms: int,
+    limit: int,
+    oi_timeframe: str,
+    with_funding: bool,
+    with_open_interest: bool,
+) -> None:
+    # 每个线程使用独立的 exchange 实例（ccxt 同步客户端非线程安全），
+    # 但所有线程共用同一个 throttle，使总请求速率不超过 OKX 的按 IP 限额
+    exchange = init_okx()
+    symbol_dir = os.path.join(base_dir, symbol_to_slug(symbol))
+    ensure_dir(symbol_dir)
+
+    if with_funding:
+        path = os.path.join(symbol_dir, FUNDING_FILE)
+        existing_df = load_existing_parquet(path)
+        start_ms = resume_start_ts(existing_df, since_ms)
+        logger.info(f"Fetching {symbol} funding from {datetime.utcfromtimestamp(start_ms/1000).isoformat()}")
+        rows = fetch_funding_all(exchange, throttle, symbol, start_ms, until_ms, limit)
+        if rows:
+            df = merge_rows(existing_df, rows, FUNDING_COLS)
+            df.to_parquet(path, index=False)
+            logger.success(f"Saved {len(df)} rows -> {path}")
+        else:
+            logger.info(f"No new funding rates for {symbol}")
+
+    if with_open_interest:
+        path = os.path.join(symbol_dir, OPEN_INTEREST_FILE)
+        existing_df = load_existing_parquet(path)
+        start_ms = resume_start_ts(existing_df, since_ms)
+        logger.info(f"Fetching {symbol} open interest ({oi_timeframe}) from {datetime.utcfromtimestamp(start_ms/1000).isoformat()}")
+        rows = fetch_open_interest_all(exchange, throttle, symbol, oi_timeframe, start_ms, until_ms, limit)
+        if rows:
+            df = merge_rows(existing_df, rows, OPEN_INTEREST_COLS)
+            df.to_parquet(path, index=False)
+            logger.success(f"Saved {len(df)} rows -> {path}")
+        else:
+            logger.info(f"No new open interest for {symbol}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch OKX perpetual funding-rate and open-interest history to Parquet with resume')
+    parser.add_argument('--symbols', nargs='+', help='Symbols like BTC/USDT:USDT ETH/USDT:USDT')
+    parser.add_argument('--since', type=str, default=None, help='Start time (YYYY-MM-DD or ISO8601). Defaults to settings.yaml')
+    parser.add_argument('--until', type=str, default=None, help='End time (YYYY-MM-DD or ISO8601). Defaults to now')
+    parser.add_argument('--base-dir', type=str, default=None, help='Base data dir, default from settings.yaml')
+    parser.add_argument('--limit', type=int, default=None, help='Max rows per request')
+    parser.add_argument('--oi-timeframe', type=str, default=None, help='Open-interest granularity: 5m, 1h or 1d')
+    parser.add_argument('--workers', type=int, default=4, help='Symbols fetched concurrently')
+    parser.add_argument('--request-interval', type=float, default=DEFAULT_REQUEST_INTERVAL,
+                        help='Minimum seconds between requests, shared by all workers')
+    parser.add_argument('--skip-funding', action='store_true')
+    parser.add_argument('--skip-open-interest', action='store_true')
+
+    args = parser.parse_args()
+
+    settings = load_settings(os.path.join('config', 'settings.yaml'))
+    base_dir = args.base_dir or settings.get('base_dir', 'data/raw')
+    symbols = args.symbols or settings.get('symbols', ['BTC/USDT:USDT'])
+    limit = args.limit or int(settings.get('max_candles_per_request', 100))
+    oi_timeframe = args.oi_timeframe or settings.get('open_interest_timeframe', '1h')
+
+    if args.since:
+        since_ms = parse_date(args.since)
+    else:
+        default_start = settings.get('start_time', '2024-01-01T00:00:00Z')
+        since_ms = parse_date(default_start)
+
+    until_ms = parse_date(args.until) if args.until else int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+
+    logger.info(f"Using base_dir={base_dir}, symbols={symbols}, oi_timeframe={oi_timeframe}, limit={limit}, workers={args.workers}")
+
+    throttle = RequestThrottle(args.request_interval)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(
+                sync_symbol, throttle, symbol, base_dir, since_ms, until_ms, limit, oi_timeframe,
+                not args.skip_funding, not args.skip_open_interest,
+            ): symbol
+            for symbol in symbols
+        }
+        for fut in as_completed(futures):
+            symbol = futures[fut]
+            try:
+                fut.result()
+            except Exception as e:
+                # 单个品种失败不影响其它品种；已落盘的数据下次运行会续传
+                logger.error(f"{symbol} failed: {e}")
+                failed.append(symbol)
+
+    if failed:
+        raise RuntimeError(f"Failed symbols: {failed}")
+    logger.info("All done.")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        logger.exception(e)
+        sys.exit(1)
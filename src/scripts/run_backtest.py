@@ -3,16 +3,21 @@
 
 import argparse
 import os
+import shutil
 import sys
+from typing import Any, Dict, Optional
 
 import backtrader as bt
 import pandas as pd
 from loguru import logger
 
 from src.strategies.ema_rsi_backtrader import EmaRsiStrategy
+from src.utils.backtest_cache import BacktestCache, make_cache_key, source_hash, to_plain
+from src.utils.funding import FUNDING_FILE, OPEN_INTEREST_FILE, align_to_candles
 
 
 class PandasDataFeed(bt.feeds.PandasData):
+    lines = ('funding_rate', 'open_interest')
     params = (
         ('datetime', 'datetime'),
         ('open', 'open'),
@@ -20,65 +25,220 @@ class PandasDataFeed(bt.feeds.PandasData):
         ('low', 'low'),
         ('close', 'close'),
         ('volume', 'volume'),
+        ('funding_rate', 'funding_rate'),
+        ('open_interest', 'open_interest'),
     )
 
 
-def load_parquet(symbol_slug: str, timeframe: str) -> pd.DataFrame:
-    path = os.path.join('data', 'raw', symbol_slug, f'{timeframe}.parquet')
+class FundingCommInfo(bt.CommInfoBase):
+    """Percentage commission plus perpetual funding on open positions.
+
+    The broker asks for credit interest on every bar with an open position;
+    the rate is read straight off the pre-aligned ``funding_rate`` line, which
+    is zero except on settlement bars.
+    """
+    params = (
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('stocklike', True),
+        ('percabs', True),
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.total_funding = 0.0
+
+    def get_credit_interest(self, data, pos, dt):
+        rate = data.funding_rate[0]
+        if not rate:
+            return 0.0
+        # 资金费率为正时多头支付、空头收取；返回值从现金中扣除
+        funding = pos.size * data.open[0] * rate
+        self.total_funding += funding
+        return funding
+
+
+def _load_optional_parquet(path: str, what: str, hint: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        logger.warning(f"{what} parquet not found: {path}. Run scripts/fetch_funding.py to include {what}, or pass {hint}.")
+        return None
+    return pd.read_parquet(path)
+
+
+def load_parquet(symbol_slug: str, timeframe: str, with_funding: bool = True, with_open_interest: bool = True) -> pd.DataFrame:
+    symbol_dir = os.path.join('data', 'raw', symbol_slug)
+    path = os.path.join(symbol_dir, f'{timeframe}.parquet')
     if not os.path.exists(path):
         raise FileNotFoundError(f"Parquet not found: {path}. Run scripts/fetch_ohlcv.py first.")
     df = pd.read_parquet(path)
+    funding = None
+    if with_funding:
+        funding = _load_optional_parquet(os.path.join(symbol_dir, FUNDING_FILE), 'funding rate', '--no-funding')
+    open_interest = None
+    if with_open_interest:
+        open_interest = _load_optional_parquet(os.path.join(symbol_dir, OPEN_INTEREST_FILE), 'open interest', '--no-open-interest')
+    df = align_to_candles(df, funding, open_interest)
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
     df.set_index('datetime', inplace=True)
-    return df[['open', 'high', 'low', 'close', 'volume']]
+    return df[['open', 'high', 'low', 'close', 'volume', 'funding_rate', 'open_interest']]
+
 
+class EquityCurve(bt.Analyzer):
+    def start(self):
+        self.curve = []
 
-def run_backtest(symbol_slug: str, timeframe: str, cash: float, commission: float, stake_pct: float, plot: bool):
-    df = load_parquet(symbol_slug, timeframe)
+    def next(self):
+        self.curve.append([self.data.datetime.datetime(0).isoformat(), self.strategy.broker.getvalue()])
+
+    def get_analysis(self):
+        return self.curve
+
+
+class TradeList(bt.Analyzer):
+    def start(self):
+        self.trades_ = []
+
+    def notify_trade(self, trade):
+        if not trade.isclosed:
+            return
+        self.trades_.append({
+            'ref': trade.ref,
+            'open': bt.num2date(trade.dtopen).isoformat(),
+            'close': bt.num2date(trade.dtclose).isoformat(),
+            'price': trade.price,
+            'pnl': trade.pnl,
+            'pnlcomm': trade.pnlcomm,
+            'barlen': trade.barlen,
+        })
+
+    def get_analysis(self):
+        return self.trades_
+
+
+def report(result: Dict[str, Any]) -> None:
+    r_dd = result['analyzers']['dd']
+    r_tr = result['analyzers']['trades']
+    r_rt = result['analyzers']['returns']
+
+    logger.success(f"Final Portfolio Value: {result['final_value']:.2f}")
+    logger.info(f"MaxDrawDown: {r_dd['max']['drawdown']:.2f}%, MaxMoneyDown: {r_dd['max']['moneydown']:.2f}")
+    # 交易统计可能因无交易而缺部分键
+    total_trades = r_tr.get('total', {}).get('total', 0)
+    won = r_tr.get('won', {}).get('total', 0)
+    lost = r_tr.get('lost', {}).get('total', 0)
+    winrate = (won / total_trades * 100.0) if total_trades else 0.0
+    logger.info(f"Trades: {total_trades}, Won: {won}, Lost: {lost}, WinRate: {winrate:.2f}%")
+    logger.info(f"Returns (Annualized): {r_rt.get('rnorm100', 0.0):.2f}%")
+    logger.info(f"Funding paid (negative = received): {result['funding_paid']:.2f}")
+
+
+def _serve_cached(cache: BacktestCache, key: str, cached: Dict[str, Any], plot: bool, outdir: str, plot_file: str) -> bool:
+    cached_plot = cache.plot_path(key) if plot else None
+    # 需要出图、缓存中没有图且上次出图未失败（来自不出图的运行）时，需完整重跑
+    if plot and not cached_plot and not cached.get('plot_failed'):
+        return False
+    if cached_plot:
+        try:
+            os.makedirs(outdir, exist_ok=True)
+            shutil.copyfile(cached_plot, plot_file)
+        except OSError as e:
+            # 条目可能刚被其它进程淘汰/替换，退回完整重跑
+            logger.warning(f"Cached plot unavailable ({e}), rerunning")
+            return False
+    logger.info(f"Cache hit {key[:12]}, skipping Cerebro run")
+    report(cached)
+    if cached_plot:
+        logger.info(f"Saved plot to {outdir}")
+    elif plot:
+        logger.warning("Plot failed on the cached run; pass --no-cache to retry plotting")
+    return True
+
+
+def run_backtest(
+    symbol_slug: str,
+    timeframe: str,
+    cash: float,
+    commission: float,
+    stake_pct: float,
+    plot: bool,
+    with_funding: bool = True,
+    with_open_interest: bool = True,
+    use_cache: bool = True,
+    cache_max_mb: float = 512.0,
+) -> Dict[str, Any]:
+    df = load_parquet(symbol_slug, timeframe, with_funding, with_open_interest)
+    stake_pct = max(1.0, min(100.0, stake_pct))
+    outdir = os.path.join('backtests')
+    plot_file = os.path.join(outdir, f'{symbol_slug}_{timeframe}.png')
+
+    cache = None
+    key = None
+    if use_cache:
+        cache = BacktestCache(os.path.join(outdir, 'cache'), int(cache_max_mb * 1024 * 1024))
+        key = make_cache_key(
+            df, EmaRsiStrategy,
+            {'cash': cash, 'commission': commission, 'stake_pct': stake_pct},
+            {'runner': source_hash(sys.modules[__name__]), 'backtrader': bt.__version__},
+        )
+        cached = cache.get(key)
+        if cached is not None and _serve_cached(cache, key, cached, plot, outdir, plot_file):
+            return cached
 
     cerebro = bt.Cerebro()
     data = PandasDataFeed(dataname=df)
     cerebro.adddata(data, name=f"{symbol_slug}-{timeframe}")
     cerebro.broker.setcash(cash)
-    cerebro.broker.setcommission(commission=commission)
-    cerebro.addsizer(bt.sizers.PercentSizer, percents=max(1.0, min(100.0, stake_pct)))
+    comminfo = FundingCommInfo(commission=commission)
+    cerebro.broker.addcommissioninfo(comminfo)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=stake_pct)
 
     cerebro.addstrategy(EmaRsiStrategy)
     cerebro.addanalyzer(bt.analyzers.DrawDown, _name='dd')
     cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
     cerebro.addanalyzer(bt.analyzers.Returns, _name='returns', tann=365)
+    cerebro.addanalyzer(TradeList, _name='trade_list')
+    cerebro.addanalyzer(EquityCurve, _name='equity')
 
     logger.info(f"Starting Portfolio Value: {cerebro.broker.getvalue():.2f}")
     results = cerebro.run()
     strat = results[0]
 
-    r_dd = strat.analyzers.dd.get_analysis()
-    r_tr = strat.analyzers.trades.get_analysis()
-    r_rt = strat.analyzers.returns.get_analysis()
-
-    logger.success(f"Final Portfolio Value: {cerebro.broker.getvalue():.2f}")
-    logger.info(f"MaxDrawDown: {r_dd.max.drawdown:.2f}%, MaxMoneyDown: {r_dd.max.moneydown:.2f}")
-    # 交易统计可能因无交易而缺部分键
-    total_trades = r_tr.get('total', {}).get('total', 0)
-    won = r_tr.get('won', {}).get('total', 0)
-    lost = r_tr.get('lost', {}).get('total', 0)
-    winrate = (won / total_trades * 100.0) if total_trades else 0.0
-    logger.info(f"Trades: {total_trades}, Won: {won}, Lost: {lost}, WinRate: {winrate:.2f}%")
-    logger.info(f"Returns (Annualized): {r_rt.get('rnorm100', 0.0):.2f}%")
+    result = to_plain({
+        'final_value': cerebro.broker.getvalue(),
+        'funding_paid': comminfo.total_funding,
+        'analyzers': {
+            'dd': strat.analyzers.dd.get_analysis(),
+            'trades': strat.analyzers.trades.get_analysis(),
+            'returns': strat.analyzers.returns.get_analysis(),
+        },
+        'trade_list': strat.analyzers.trade_list.get_analysis(),
+        'equity_curve': strat.analyzers.equity.get_analysis(),
+    })
+    report(result)
 
+    plotted = False
     if plot:
-        outdir = os.path.join('backtests')
         os.makedirs(outdir, exist_ok=True)
         # Avoid interactive GUI backends in headless envs
         try:
             import matplotlib
             matplotlib.use('Agg')
             fig = cerebro.plot(style='candlestick')[0][0]
-            fig.savefig(os.path.join(outdir, f'{symbol_slug}_{timeframe}.png'), dpi=150, bbox_inches='tight')
+            fig.savefig(plot_file, dpi=150, bbox_inches='tight')
+            plotted = True
             logger.info(f"Saved plot to {outdir}")
         except Exception as e:
             logger.warning(f"Plot failed: {e}")
 
+    if cache is not None:
+        # 记录出图失败，避免无图形后端的环境在每次 --plot 时都完整重跑
+        result['plot_failed'] = plot and not plotted
+        # 缓存写入失败（磁盘满、并发进程竞争同一键等）不应影响已算出的结果
+        try:
+            cache.put(key, result, plot_file if plotted else None)
+        except Exception as e:
+            logger.warning(f"Cache write failed: {e}")
+    return result
+
 
 def main():
     parser = argparse.ArgumentParser(description='Run Backtrader backtest on Parquet OHLCV')
@@ -88,10 +248,17 @@ def main():
     parser.add_argument('--commission', type=float, default=0.0005)
     parser.add_argument('--stake-pct', type=float, default=95.0, help='Percent of cash to allocate per trade (1-100)')
     parser.add_argument('--plot', action='store_true')
+    parser.add_argument('--no-funding', action='store_true', help='Ignore funding-rate history')
+    parser.add_argument('--no-open-interest', action='store_true', help='Ignore open-interest history')
+    parser.add_argument('--no-cache', action='store_true', help='Always rerun instead of reusing cached results')
+    parser.add_argument('--cache-max-mb', type=float, default=512.0, help='Size bound of backtests/cache (LRU eviction)')
     args = parser.parse_args()
 
     try:
-        run_backtest(args.symbol_slug, args.timeframe, args.cash, args.commission, args.stake_pct, args.plot)
+        run_backtest(
+            args.symbol_slug, args.timeframe, args.cash, args.commission, args.stake_pct, args.plot,
+            with_funding=not args.no_funding, with_open_interest=not args.no_open_interest, use_cache=not args.no_cache, cache_max_mb=args.cache_max_mb,
+        )
     except Exception as e:
         logger.exception(e)
         sys.exit(1)
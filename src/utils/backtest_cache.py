@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+# 结果格式变化时递增，使旧缓存自然失效
+CACHE_VERSION = 1
+
+RESULT_FILE = 'result.json'
+PLOT_FILE = 'plot.png'
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    h = hashlib.sha256(row_hashes.tobytes())
+    h.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def source_hash(obj: Any) -> str:
+    try:
+        source = inspect.getsource(obj)
+    except (OSError, TypeError):
+        source = ''
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def strategy_fingerprint(strategy_cls: type) -> Dict[str, Any]:
+    return {
+        'name': f"{strategy_cls.__module__}.{strategy_cls.__qualname__}",
+        'params': dict(strategy_cls.params._getpairs()),
+        # 整个策略模块（含辅助函数），而非仅策略类
+        'module': source_hash(sys.modules[strategy_cls.__module__]),
+    }
+
+
+def make_cache_key(df: pd.DataFrame, strategy_cls: type, broker: Dict[str, Any], runtime: Dict[str, Any]) -> str:
+    """Hash everything that determines a backtest's output.
+
+    ``runtime`` identifies the code that runs and records the backtest (e.g.
+    the runner module's source hash and the backtrader version), so edits to
+    accounting or analyzers invalidate old entries without bumping
+    ``CACHE_VERSION``.
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'cache': source_hash(sys.modules[__name__]),
+        'data': hash_frame(df),
+        'strategy': strategy_fingerprint(strategy_cls),
+        'broker': broker,
+        'runtime': runtime,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(blob).hexdigest()
+
+
+def to_plain(obj: Any) -> Any:
+    # AutoOrderedDict 等分析器输出转为可 JSON 序列化的结构
+    if isinstance(obj, dict):
+        return {str(k): to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(v) for v in obj]
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    try:
+        return float(obj)
+    except (TypeError, ValueError):
+        return str(obj)
+
+
+class BacktestCache:
+    """Content-addressed store of backtest results with size-bounded LRU eviction.
+
+    Each entry is a directory named by its key holding ``result.json`` and an
+    optional ``plot.png``; the directory mtime is bumped on every hit and the
+    least recently used entries are dropped once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._entry_dir(key), RESULT_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._entry_dir(key))
+        except OSError:
+            # 条目可能刚被其它进程淘汰/替换，不影响本次读取
+            pass
+        return result
+
+    def plot_path(self, key: str) -> Optional[str]:
+        path = os.path.join(self._entry_dir(key), PLOT_FILE)
+        return path if os.path.exists(path) else None
+
+    def put(self, key: str, result: Dict[str, Any], plot_path: Optional[str] = None) -> None:
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            with open(os.path.join(tmp_dir, RESULT_FILE), 'w', encoding='utf-8') as f:
+                json.dump(to_plain(result), f, ensure_ascii=False)
+            if plot_path and os.path.exists(plot_path):
+                shutil.copyfile(plot_path, os.path.join(tmp_dir, PLOT_FILE))
+            # mkdtemp 默认 0700，放宽以便其它用户（如看板进程）读取
+            os.chmod(tmp_dir, 0o755)
+            entry_dir = self._entry_dir(key)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+        entries.sort()
+        # 保留最近使用的条目，即使其本身超出上限
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
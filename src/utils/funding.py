@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+FUNDING_FILE = 'funding_rate.parquet'
+OPEN_INTEREST_FILE = 'open_interest.parquet'
+
+FUNDING_COLS = ['timestamp', 'funding_rate']
+OPEN_INTEREST_COLS = ['timestamp', 'open_interest', 'open_interest_value']
+
+
+def align_to_candles(
+    candles: pd.DataFrame,
+    funding: Optional[pd.DataFrame] = None,
+    open_interest: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Align funding settlements and open interest onto candle timestamps.
+
+    All frames carry an int64 millisecond ``timestamp`` column. The result adds
+    ``funding_rate``, the sum of all settlements in ``(prev_ts, ts]`` for each
+    bar (settlements before the first or after the last candle are dropped),
+    and ``open_interest``, the last known value as of each bar (NaN before the
+    first sample).
+    """
+    out = candles.sort_values('timestamp').reset_index(drop=True)
+    ts = out['timestamp'].to_numpy(dtype='int64')
+    left = pd.DataFrame({'timestamp': ts})
+
+    if funding is not None and not funding.empty and len(ts):
+        f = funding.drop_duplicates('timestamp')
+        f_ts = f['timestamp'].to_numpy(dtype='int64')
+        rate = f['funding_rate'].astype('float64').fillna(0.0).to_numpy()
+        # 结算时间点落在 (上一根K线, 当前K线] 区间内计入当前K线；多次结算累加
+        idx = np.searchsorted(ts, f_ts, side='left')
+        keep = (f_ts >= ts[0]) & (idx < len(ts))
+        out['funding_rate'] = np.bincount(idx[keep], weights=rate[keep], minlength=len(ts))
+    else:
+        out['funding_rate'] = 0.0
+
+    if open_interest is not None and not open_interest.empty:
+        right = pd.DataFrame({
+            'oi_ts': open_interest['timestamp'].astype('int64'),
+            'open_interest': open_interest['open_interest'].astype('float64'),
+        }).drop_duplicates('oi_ts').sort_values('oi_ts')
+        merged = pd.merge_asof(left, right, left_on='timestamp', right_on='oi_ts', direction='backward')
+        out['open_interest'] = merged['open_interest'].to_numpy()
+    else:
+        out['open_interest'] = float('nan')
+
+    return out